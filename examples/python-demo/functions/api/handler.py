@@ -1,57 +1,326 @@
-import json
-import os
 import base64
+import io
+import os
+import queue
+import threading
+import time
 import uuid
-import pg8000
-import boto3
+from contextlib import contextmanager
 from urllib.parse import urlparse
 
-# Parse DATABASE_URL and connect
-db_conn = None
+# orjson is much faster than the stdlib json module and serializes datetimes
+# natively; fall back to json when the wheel doesn't match the platform.
+# json_dumps returns UTF-8 bytes either way.
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    import json
+
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj, default=lambda o: o.isoformat()).encode('utf-8')
+
+# pybase64 decodes with SIMD kernels; same fallback rule as orjson
+try:
+    from pybase64 import b64decode
+except ImportError:
+    from base64 import b64decode
+
+db_url = os.environ.get('DATABASE_URL')
 db_error = None
-s3_client = None
 s3_bucket = os.environ.get('STORAGE_BUCKET')
 
-try:
-    db_url = os.environ.get('DATABASE_URL')
-    if db_url:
-        parsed = urlparse(db_url)
-        db_conn = pg8000.connect(
-            host=parsed.hostname,
-            port=parsed.port or 5432,
-            database=parsed.path[1:],
-            user=parsed.username,
-            password=parsed.password,
-            ssl_context=True
+# Database health, kept current by a background heartbeat and by requests
+# that hit a connection error, so status never needs a round-trip
+HEARTBEAT_INTERVAL = 30
+HEARTBEAT_TIMEOUT = int(os.environ.get('DB_TIMEOUT', '5'))
+db_healthy = False  # only check_db() sets this to True
+db_last_ok = None
+
+# Connection pool (reused across invocations). Each request checks out its
+# own connection, and connections with a broken socket are discarded.
+db_pool = queue.LifoQueue(maxsize=int(os.environ.get('DB_POOL_MAX', '4')))
+
+
+# pg8000 and boto3 are imported on first use, so module import stays cheap.
+# connect_db() fills in pg8000's exception
+# classes for run() and get_conn(), which only ever see a connection after
+# it has run.
+DB_ERRORS = ()
+DB_DATABASE_ERROR = Exception
+
+
+def connect_db(timeout=None):
+    global DB_ERRORS, DB_DATABASE_ERROR
+    import pg8000
+
+    DB_ERRORS = (pg8000.InterfaceError, pg8000.OperationalError)
+    DB_DATABASE_ERROR = pg8000.DatabaseError
+
+    parsed = urlparse(db_url)
+    conn = pg8000.connect(
+        host=parsed.hostname,
+        port=parsed.port or 5432,
+        database=parsed.path[1:],
+        user=parsed.username,
+        password=parsed.password,
+        ssl_context=True,
+        timeout=timeout
+    )
+    conn.autocommit = True
+    conn.prepared_statements = {}
+    return conn
+
+
+def put_conn(conn, close=False):
+    if not close:
+        try:
+            db_pool.put_nowait(conn)
+            return
+        except queue.Full:
+            pass
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+# List endpoints return PAGE_SIZE rows per page, newest first
+PAGE_SIZE = 50
+
+# Queries are prepared once per connection, so Postgres parses and plans
+# each one only the first time a warm container runs it. List queries fetch
+# one extra row to tell whether there is a next page, and the *_after
+# variants continue from a (created_at, id) cursor using the btree index.
+STATEMENTS = {
+    'list_items': f'SELECT id, name, description, created_at FROM items ORDER BY created_at DESC, id DESC LIMIT {PAGE_SIZE + 1}',
+    'list_items_after': f'SELECT id, name, description, created_at FROM items WHERE (created_at, id) < (CAST(:created_at AS TIMESTAMP), CAST(:id AS INTEGER)) ORDER BY created_at DESC, id DESC LIMIT {PAGE_SIZE + 1}',
+    'create_item': 'INSERT INTO items (name, description) VALUES (:name, :description) RETURNING id, created_at',
+    'create_items': 'INSERT INTO items (name, description) SELECT * FROM unnest(CAST(:names AS VARCHAR[]), CAST(:descriptions AS TEXT[])) RETURNING id, name, description, created_at',
+    'delete_item': 'DELETE FROM items WHERE id = :id RETURNING id',
+    'insert_media': 'INSERT INTO media (filename, s3_key, content_type, size_bytes) SELECT CAST(:filename AS VARCHAR), CAST(:s3_key AS VARCHAR), CAST(:content_type AS VARCHAR), CAST(:size_bytes AS INTEGER) WHERE NOT EXISTS (SELECT 1 FROM media WHERE s3_key = :s3_key) RETURNING id, created_at',
+    'list_media': f'SELECT id, filename, s3_key, content_type, size_bytes, created_at FROM media ORDER BY created_at DESC, id DESC LIMIT {PAGE_SIZE + 1}',
+    'list_media_after': f'SELECT id, filename, s3_key, content_type, size_bytes, created_at FROM media WHERE (created_at, id) < (CAST(:created_at AS TIMESTAMP), CAST(:id AS INTEGER)) ORDER BY created_at DESC, id DESC LIMIT {PAGE_SIZE + 1}',
+    'delete_media': 'DELETE FROM media WHERE id = ANY(:ids) RETURNING s3_key',
+}
+
+
+def run(conn, name, **params):
+    statement = conn.prepared_statements.get(name)
+    if statement is None:
+        try:
+            statement = conn.prepare(STATEMENTS[name])
+        except DB_DATABASE_ERROR as e:
+            # 42P01 = undefined_table: create the schema and try again
+            if not isinstance(e.args[0], dict) or e.args[0].get('C') != '42P01':
+                raise
+            migrate(conn)
+            statement = conn.prepare(STATEMENTS[name])
+        conn.prepared_statements[name] = statement
+    return statement.run(**params)
+
+
+@contextmanager
+def get_conn():
+    if not db_url:
+        raise Exception('Database not configured')
+
+    try:
+        conn = db_pool.get_nowait()
+    except queue.Empty:
+        try:
+            conn = connect_db()
+        except Exception as e:
+            mark_unhealthy(e)
+            raise
+
+    broken = False
+    try:
+        yield conn
+    except DB_ERRORS as e:
+        broken = True
+        mark_unhealthy(e)
+        raise
+    finally:
+        put_conn(conn, close=broken)
+
+
+# A dead connection usually means the others are dead too (e.g. after a
+# database restart), so drop every idle one and reconnect on demand
+def mark_unhealthy(error):
+    global db_healthy, db_error
+    db_healthy = False
+    db_error = str(error)
+    while True:
+        try:
+            put_conn(db_pool.get_nowait(), close=True)
+        except queue.Empty:
+            return
+
+
+# Tables are created on first use, so cold starts skip the DDL round-trips.
+# Set AUTO_MIGRATE=1 to create them at startup instead, or run
+# `python handler.py` once at deploy time. Existing databases only pick up
+# later additions (like the created_at indexes) from one of those two.
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS items (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS media (
+        id SERIAL PRIMARY KEY,
+        filename VARCHAR(255) NOT NULL,
+        s3_key VARCHAR(500) NOT NULL,
+        content_type VARCHAR(100),
+        size_bytes INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS items_created_at_desc ON items (created_at DESC, id DESC)',
+    'CREATE INDEX IF NOT EXISTS media_created_at_desc ON media (created_at DESC, id DESC)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS media_s3_key ON media (s3_key)',
+]
+
+
+def migrate(conn):
+    with conn.cursor() as cur:
+        for statement in SCHEMA:
+            cur.execute(statement)
+
+
+# The init thread warms the client while the first request may already
+# need it, so build it once under a lock from a private session (boto3's
+# default session is not thread-safe)
+s3_client = None
+s3_client_lock = threading.Lock()
+
+
+def get_s3():
+    global s3_client
+    if not s3_bucket:
+        raise Exception('Storage not configured')
+    if s3_client is not None:
+        return s3_client
+
+    with s3_client_lock:
+        if s3_client is None:
+            s3_client = create_s3_client()
+    return s3_client
+
+
+def create_s3_client():
+    import boto3
+    from botocore.config import Config
+
+    # Pooled keep-alive connections so warm containers reuse TLS sessions
+    # across uploads, deletes and presigning
+    return boto3.session.Session().client(
+        's3',
+        region_name=os.environ.get('STORAGE_REGION') or os.environ.get('AWS_REGION'),
+        config=Config(
+            signature_version='s3v4',
+            max_pool_connections=50,
+            retries={'mode': 'standard', 'max_attempts': 3},
+            tcp_keepalive=True,
+            s3={'addressing_style': 'virtual'}
         )
-        db_conn.autocommit = True
-
-        cur = db_conn.cursor()
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS items (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS media (
-                id SERIAL PRIMARY KEY,
-                filename VARCHAR(255) NOT NULL,
-                s3_key VARCHAR(500) NOT NULL,
-                content_type VARCHAR(100),
-                size_bytes INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        cur.close()
-except Exception as e:
-    db_error = str(e)
-
-# Initialize S3 client
-if s3_bucket:
-    s3_client = boto3.client('s3')
+    )
+
+
+# The heartbeat has its own connection with a socket timeout, so a
+# half-open socket fails fast. Pooled connections have no timeout, so slow
+# queries and migrations (e.g. CREATE INDEX on a large table) can finish.
+heartbeat_conn = None
+heartbeat_lock = threading.Lock()
+
+
+def db_checked_recently():
+    return db_last_ok is not None and time.time() - db_last_ok < 2 * HEARTBEAT_INTERVAL
+
+
+def check_db(only_if_stale=False):
+    global heartbeat_conn, db_healthy, db_last_ok, db_error
+    with heartbeat_lock:
+        # Another thread may have finished a check while this one waited
+        if only_if_stale and db_checked_recently():
+            return
+        try:
+            if heartbeat_conn is None:
+                heartbeat_conn = connect_db(timeout=HEARTBEAT_TIMEOUT)
+            with heartbeat_conn.cursor() as cur:
+                cur.execute('SELECT 1')
+        except Exception as e:
+            if heartbeat_conn is not None:
+                try:
+                    heartbeat_conn.close()
+                except Exception:
+                    pass
+                heartbeat_conn = None
+            mark_unhealthy(e)
+            return
+        db_healthy, db_last_ok, db_error = True, time.time(), None
+
+
+# Connect (and optionally migrate) in the background so the first request
+# doesn't wait on the TLS handshake to Postgres, then keep checking the
+# database so status can answer from memory
+def init():
+    if db_url:
+        try:
+            with get_conn() as conn:
+                if os.environ.get('AUTO_MIGRATE') == '1':
+                    migrate(conn)
+        except Exception as e:
+            mark_unhealthy(e)
+        check_db()
+
+    if s3_bucket:
+        get_s3()
+
+    while db_url:
+        time.sleep(HEARTBEAT_INTERVAL)
+        check_db()
+
+
+threading.Thread(target=init, daemon=True).start()
+
+# (health state, encoded body) of the last status response
+status_cache = (None, None)
+
+
+def get_status(body):
+    global status_cache
+    # Answer from memory only while the last check is fresh. On a cold start
+    # (first check still running) or after the container was frozen between
+    # invocations, check now rather than report a healthy database as down.
+    if db_url and not db_checked_recently():
+        check_db(only_if_stale=True)
+
+    db_ok = db_healthy and db_checked_recently()
+    state = (db_ok, db_last_ok, db_error)
+    if status_cache[0] == state:
+        return status_cache[1]
+
+    result = json_dumps({
+        'status': 'ok',
+        'python': '3.13',
+        'db': db_ok,
+        'dbLastOk': db_last_ok,
+        'storage': s3_bucket is not None,
+        'dbError': db_error or ''
+    })
+    # Only re-encode when the health state changes
+    status_cache = (state, result)
+    return result
 
 
 def main(event, context):
@@ -61,103 +330,118 @@ def main(event, context):
     }
 
     try:
-        body = json.loads(event.get('body') or '{}')
+        body = json_loads(event.get('body') or '{}')
         action = body.get('action', 'status')
 
-        if action == 'list':
-            result = list_items()
-        elif action == 'create':
-            result = create_item(body)
-        elif action == 'delete':
-            result = delete_item(body)
-        elif action == 'upload':
-            result = upload_media(body)
-        elif action == 'list-media':
-            result = list_media()
-        elif action == 'delete-media':
-            result = delete_media(body)
-        else:
-            result = {
-                'status': 'ok',
-                'python': '3.13',
-                'db': db_conn is not None,
-                'storage': s3_bucket is not None,
-                'dbError': db_error or ''
-            }
+        result = ACTIONS.get(action, get_status)(body)
+
+        # List endpoints and status return already-serialized bytes, and
+        # handlers can return (statusCode, body bytes) to skip encoding
+        status_code = 200
+        if isinstance(result, tuple):
+            status_code, result = result
+        elif not isinstance(result, bytes):
+            result = json_dumps(result)
+
+        if not result:
+            headers['Content-Length'] = '0'
 
         return {
-            'statusCode': 200,
+            'statusCode': status_code,
             'headers': headers,
-            'body': json.dumps(result)
+            'body': result.decode('utf-8')
         }
 
     except Exception as e:
         return {
             'statusCode': 500,
             'headers': headers,
-            'body': json.dumps({'error': str(e)})
+            'body': json_dumps({'error': str(e)}).decode('utf-8')
         }
 
 
-def list_items():
-    if not db_conn:
-        raise Exception(f'Database not connected: {db_error}')
+# Runs a list statement from body['cursor'] and returns (rows, next_cursor).
+# Rows must start with id and end with created_at; the cursor is an opaque
+# base64 token of the last row's (created_at, id).
+def fetch_page(name, body):
+    cursor = body.get('cursor')
+    with get_conn() as conn:
+        if cursor:
+            created_at, row_id = json_loads(base64.urlsafe_b64decode(cursor))
+            rows = run(conn, f'{name}_after', created_at=created_at, id=row_id)
+        else:
+            rows = run(conn, name)
 
-    cur = db_conn.cursor()
-    cur.execute('SELECT id, name, description, created_at FROM items ORDER BY created_at DESC LIMIT 50')
-    rows = cur.fetchall()
-    cur.close()
-    return [
+    if len(rows) <= PAGE_SIZE:
+        return rows, None
+    rows = rows[:PAGE_SIZE]
+    next_cursor = base64.urlsafe_b64encode(json_dumps([rows[-1][-1], rows[-1][0]])).decode('ascii')
+    return rows, next_cursor
+
+
+def list_items(body):
+    rows, next_cursor = fetch_page('list_items', body)
+    items = [
         {
             'id': row[0],
             'name': row[1],
             'description': row[2] or '',
-            'createdAt': str(row[3])
+            'createdAt': row[3]
         }
         for row in rows
     ]
+    return json_dumps({'items': items, 'nextCursor': next_cursor})
 
 
 def create_item(body):
-    if not db_conn:
-        raise Exception(f'Database not connected: {db_error}')
-
     name = body.get('name')
     description = body.get('description', '')
 
-    cur = db_conn.cursor()
-    cur.execute(
-        'INSERT INTO items (name, description) VALUES (%s, %s) RETURNING id, created_at',
-        (name, description)
-    )
-    row = cur.fetchone()
-    cur.close()
+    with get_conn() as conn:
+        row = run(conn, 'create_item', name=name, description=description)[0]
     return {
         'id': row[0],
         'name': name,
         'description': description,
-        'createdAt': str(row[1])
+        'createdAt': row[1]
     }
 
 
-def delete_item(body):
-    if not db_conn:
-        raise Exception(f'Database not connected: {db_error}')
+def create_items_bulk(body):
+    items = body.get('items')
+    if not isinstance(items, list) or not all(isinstance(item, dict) and item.get('name') for item in items):
+        raise Exception('items must be a list of {name, description}')
+    if not items:
+        return []
+
+    # One INSERT for the whole batch instead of one round-trip per item
+    with get_conn() as conn:
+        rows = run(
+            conn, 'create_items',
+            names=[item['name'] for item in items],
+            descriptions=[item.get('description', '') for item in items]
+        )
+    return [
+        {
+            'id': row[0],
+            'name': row[1],
+            'description': row[2],
+            'createdAt': row[3]
+        }
+        for row in rows
+    ]
+
 
+def delete_item(body):
     item_id = body.get('id')
 
-    cur = db_conn.cursor()
-    cur.execute('DELETE FROM items WHERE id = %s', (item_id,))
-    deleted = cur.rowcount > 0
-    cur.close()
-    return {'deleted': deleted}
+    with get_conn() as conn:
+        rows = run(conn, 'delete_item', id=item_id)
+    return (204, b'') if rows else (404, b'')
 
 
 def upload_media(body):
-    if not db_conn:
-        raise Exception(f'Database not connected: {db_error}')
-    if not s3_client:
-        raise Exception('Storage not configured')
+    s3_client = get_s3()
 
     filename = body.get('filename', 'file')
     content_type = body.get('contentType', 'application/octet-stream')
@@ -166,44 +450,84 @@ def upload_media(body):
     if not data:
         raise Exception('No file data provided')
 
-    file_bytes = base64.b64decode(data)
+    # upload_fileobj streams from the file object; BytesIO shares the
+    # decoded bytes instead of copying them
+    file_bytes = b64decode(data)
+    size_bytes = len(file_bytes)
+    file_obj = io.BytesIO(file_bytes)
     s3_key = f"media/{uuid.uuid4()}/{filename}"
 
-    s3_client.put_object(
-        Bucket=s3_bucket,
-        Key=s3_key,
-        Body=file_bytes,
-        ContentType=content_type
+    s3_client.upload_fileobj(
+        file_obj,
+        s3_bucket,
+        s3_key,
+        ExtraArgs={'ContentType': content_type}
     )
 
+    return register_media(filename, s3_key, content_type, size_bytes)
+
+
+def upload_media_init(body):
+    s3_client = get_s3()
+
+    filename = body.get('filename', 'file')
+    content_type = body.get('contentType', 'application/octet-stream')
+    s3_key = f"media/{uuid.uuid4()}/{filename}"
+
+    # The client PUTs the raw file straight to S3, so nothing is base64
+    # encoded and the bytes never pass through the Lambda
+    upload_url = s3_client.generate_presigned_url(
+        'put_object',
+        Params={'Bucket': s3_bucket, 'Key': s3_key, 'ContentType': content_type},
+        ExpiresIn=900
+    )
+    return {
+        'uploadUrl': upload_url,
+        'headers': {'Content-Type': content_type},
+        's3Key': s3_key
+    }
+
+
+def upload_media_commit(body):
+    s3_client = get_s3()
+
+    filename = body.get('filename', 'file')
+    s3_key = body.get('s3Key') or ''
+
+    if not s3_key.startswith('media/'):
+        raise Exception('Invalid s3Key')
+
+    # Read size and type from S3 so the row matches what was uploaded
+    head = s3_client.head_object(Bucket=s3_bucket, Key=s3_key)
+    return register_media(filename, s3_key, head.get('ContentType'), head['ContentLength'])
+
+
+def register_media(filename, s3_key, content_type, size_bytes):
     # Use CloudFront URL
     url = f"/{s3_key}"
 
-    cur = db_conn.cursor()
-    cur.execute(
-        'INSERT INTO media (filename, s3_key, content_type, size_bytes) VALUES (%s, %s, %s, %s) RETURNING id, created_at',
-        (filename, s3_key, content_type, len(file_bytes))
-    )
-    row = cur.fetchone()
-    cur.close()
+    # One row per S3 object: deleting a duplicate would remove the file
+    # another row still points at
+    with get_conn() as conn:
+        rows = run(
+            conn, 'insert_media',
+            filename=filename, s3_key=s3_key, content_type=content_type, size_bytes=size_bytes
+        )
+    if not rows:
+        raise Exception('Media already registered')
+    row = rows[0]
     return {
         'id': row[0],
         'filename': filename,
         's3Key': s3_key,
         'url': url,
-        'createdAt': str(row[1])
+        'createdAt': row[1]
     }
 
 
-def list_media():
-    if not db_conn:
-        raise Exception(f'Database not connected: {db_error}')
-
-    cur = db_conn.cursor()
-    cur.execute('SELECT id, filename, s3_key, content_type, size_bytes, created_at FROM media ORDER BY created_at DESC LIMIT 50')
-    rows = cur.fetchall()
-    cur.close()
-    return [
+def list_media(body):
+    rows, next_cursor = fetch_page('list_media', body)
+    media = [
         {
             'id': row[0],
             'filename': row[1],
@@ -211,27 +535,62 @@ def list_media():
             'url': f"/{row[2]}",
             'contentType': row[3],
             'sizeBytes': row[4],
-            'createdAt': str(row[5])
+            'createdAt': row[5]
         }
         for row in rows
     ]
+    return json_dumps({'media': media, 'nextCursor': next_cursor})
 
 
 def delete_media(body):
-    if not db_conn:
-        raise Exception(f'Database not connected: {db_error}')
-    if not s3_client:
-        raise Exception('Storage not configured')
-
-    media_id = body.get('id')
-
-    cur = db_conn.cursor()
-    cur.execute('SELECT s3_key FROM media WHERE id = %s', (media_id,))
-    row = cur.fetchone()
-    if row:
-        s3_client.delete_object(Bucket=s3_bucket, Key=row[0])
-        cur.execute('DELETE FROM media WHERE id = %s', (media_id,))
-        cur.close()
-        return {'deleted': True}
-    cur.close()
-    return {'deleted': False}
+    result = delete_media_bulk({'ids': [body.get('id')]})
+    return (204, b'') if result['deleted'] else (404, b'')
+
+
+def delete_media_bulk(body):
+    s3_client = get_s3()
+
+    media_ids = body.get('ids') or []
+    if not media_ids:
+        return {'deleted': 0}
+
+    # Delete the rows first so a failed S3 call leaves orphaned objects
+    # rather than rows pointing at missing files
+    with get_conn() as conn:
+        rows = run(conn, 'delete_media', ids=media_ids)
+    if not rows:
+        return {'deleted': 0}
+
+    # delete_objects removes up to 1000 keys per request
+    keys = [row[0] for row in rows]
+    for i in range(0, len(keys), 1000):
+        response = s3_client.delete_objects(
+            Bucket=s3_bucket,
+            Delete={'Objects': [{'Key': key} for key in keys[i:i + 1000]], 'Quiet': True}
+        )
+        if response.get('Errors'):
+            raise Exception(f"Failed to delete {response['Errors'][0]['Key']}: {response['Errors'][0]['Message']}")
+
+    return {'deleted': len(rows)}
+
+
+# Action name -> handler. Each handler takes the parsed request body;
+# unknown actions fall back to get_status.
+ACTIONS = {
+    'status': get_status,
+    'list': list_items,
+    'create': create_item,
+    'create-bulk': create_items_bulk,
+    'delete': delete_item,
+    'upload': upload_media,
+    'upload-init': upload_media_init,
+    'upload-commit': upload_media_commit,
+    'list-media': list_media,
+    'delete-media': delete_media,
+    'delete-media-bulk': delete_media_bulk,
+}
+
+
+if __name__ == '__main__':
+    with get_conn() as conn:
+        migrate(conn)